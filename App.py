@@ -1,9 +1,17 @@
 # Importamos FastAPI para crear la API.
 from fastapi import FastAPI
 
+# functools nos da lru_cache para memorizar los resultados simbólicos de expresiones repetidas.
+import functools
+
 # Importamos las funciones y clases necesarias de sympy para manejar expresiones matemáticas simbólicas,
 # hacer integrales y trabajar con funciones matemáticas comunes como sin, cos, log, etc.
-from sympy import symbols, integrate, sin, cos, log, tan, exp, sympify, lambdify
+from sympy import symbols, integrate, sin, cos, log, tan, exp, lambdify, latex, degree, Poly
+from sympy import asin, acos, atan, sinh, cosh, tanh, sqrt, pi, E, Integer, Float, Rational, Symbol, Expr
+
+# El analizador de sympy nos permite leer la expresión solo con las funciones permitidas, sin el "eval" general de sympify.
+from sympy.parsing.sympy_parser import (parse_expr, standard_transformations, convert_xor, implicit_multiplication,
+                                        implicit_application, function_exponentiation)
 
 # Pydantic se usa para definir modelos de datos en FastAPI, en este caso, para manejar las solicitudes de integrales.
 from pydantic import BaseModel
@@ -11,20 +19,79 @@ from pydantic import BaseModel
 # Importamos el middleware de CORS para permitir solicitudes desde cualquier origen. Esto es útil si la API se consume desde diferentes dominios.
 from fastapi.middleware.cors import CORSMiddleware
 
+# asyncio, concurrent.futures y os nos permiten ejecutar el cálculo en un grupo de procesos, uno por núcleo de CPU,
+# para no bloquear el bucle de eventos mientras se calcula la integral.
+import asyncio
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import os
+
+# contextlib nos permite definir las tareas de arranque de la aplicación (lifespan) con un administrador de contexto.
+import contextlib
+
 # Matplotlib se utiliza para generar gráficos, y en este caso, se usa para graficar las funciones originales e integrales.
+# Como el servidor no tiene interfaz gráfica, fijamos explícitamente el backend "Agg" antes de importar pyplot.
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
 # Numpy nos permite trabajar con arreglos numéricos y realizar operaciones matemáticas de forma eficiente.
 import numpy as np
 
+# Pillow se usa para dibujar los textos de la gráfica y codificarla como PNG sin pasar por matplotlib.
+from PIL import Image, ImageDraw, ImageFont
+
+# Numba compila las funciones numéricas a código máquina para evaluar la gráfica más rápido.
+# Si no está instalado, usamos directamente las funciones generadas por lambdify.
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Numexpr evalúa toda la expresión en una sola pasada sobre el arreglo, sin crear arreglos temporales por cada operación.
+# Si no está instalado, seguimos con el camino de numpy/numba.
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+# SymEngine es una implementación en C++ de parte de sympy. Usamos su Lambdify con el backend LLVM, que compila
+# la expresión a código máquina. Si no está instalado, generamos las funciones numéricas con sympy.
+try:
+    import symengine
+except ImportError:
+    symengine = None
+
 # La librería io se usa para manejar flujos de entrada/salida, en este caso, para crear un buffer para guardar la imagen del gráfico.
 import io
 
-# StreamingResponse se utiliza para enviar el gráfico generado como una respuesta de imagen.
-from fastapi.responses import StreamingResponse
+# tokenize nos permite revisar la expresión antes de analizarla y rechazar accesos a atributos o cadenas de texto.
+import tokenize
+
+# base64 nos permite incluir la imagen PNG del gráfico directamente en la respuesta JSON.
+import base64
+
+# orjson serializa las respuestas JSON mucho más rápido que el módulo json estándar, sobre todo con listas de textos largos
+# como la explicación en LaTeX.
+import orjson
+from fastapi.responses import JSONResponse, Response
+
+# Respuesta JSON serializada con orjson. La definimos aquí porque ORJSONResponse de FastAPI está marcada como obsoleta.
+class ORJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
 
-# Inicializamos la aplicación FastAPI
-app = FastAPI()
+# Al arrancar la aplicación iniciamos los procesos de cálculo y esperamos a que terminen su preparación (ver _warmup),
+# para que ese costo no lo pague la primera solicitud.
+@contextlib.asynccontextmanager
+async def _lifespan(app):
+    await asyncio.gather(*(_run_in_pool(_ready) for _ in range(_WORKERS)))
+    yield
+    # Al apagar el servidor (o al recargarlo con --reload) no esperamos a los cálculos pendientes.
+    _POOL.shutdown(wait=False, cancel_futures=True)
+
+# Inicializamos la aplicación FastAPI usando orjson para todas las respuestas JSON.
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=_lifespan)
 
 # Definimos el modelo de datos que se espera recibir en la solicitud de la API.
 # En este caso, incluye la expresión matemática a integrar y, opcionalmente, los límites de integración.
@@ -42,152 +109,507 @@ app.add_middleware(
     allow_headers=["*"],  # Permitir todos los encabezados en las solicitudes
 )
 
-# Variable global para almacenar el gráfico generado más recientemente, lo que nos permitirá devolverlo cuando se solicite.
-graph_buffer = None
+# Conjunto de valores de X entre -10 y 10 para la gráfica. Es el mismo en todas las solicitudes,
+# así que lo creamos una sola vez en lugar de reservar un arreglo nuevo por cada petición.
+# Usamos float32: la mitad de bytes por valor permite procesar el doble de valores por instrucción SIMD al evaluar
+# las funciones. Su rango y precisión son menores que los de float64: potencias altas (por ejemplo x**40) se desbordan
+# a infinito, y por eso en ese caso se vuelve a evaluar con _X_VALS_F64 (ver _plot_png). Las expresiones con
+# cancelaciones grandes entre términos pueden perder precisión visible con float32.
+_X_VALS = np.linspace(-10, 10, 400, dtype=np.float32)
+_X_VALS_F64 = _X_VALS.astype(np.float64)
 
-# Ruta para calcular la integral, donde recibimos una expresión matemática en formato string.
-@app.post("/calculate-integral")
-async def calculate_integral(request: IntegralRequest):
-    global graph_buffer  # Usamos una variable global para manejar el buffer de la gráfica
+# Forma de dibujar la gráfica. Por defecto la dibujamos directamente con numpy y Pillow, que es mucho más rápido para
+# dos curvas simples; con la variable de entorno PLOT_BACKEND=matplotlib se usa la versión con matplotlib.
+_PLOT_BACKEND = os.environ.get("PLOT_BACKEND", "pillow")
+
+# Con matplotlib, cada proceso de cálculo reutiliza una figura y unos ejes en todas sus solicitudes para no crear
+# y destruir una figura completa cada vez. Cada proceso atiende una solicitud a la vez, así que no hace falta
+# sincronizar el acceso. Solo la creamos si se usa matplotlib.
+if _PLOT_BACKEND == "matplotlib":
+    _FIG, _AX = plt.subplots(figsize=(10, 6))
+
+# Tamaño de la imagen en píxeles (equivalente a la figura de 10x6 pulgadas a 72 DPI) y márgenes del área de la gráfica.
+_WIDTH, _HEIGHT = 720, 432
+_LEFT, _RIGHT, _TOP, _BOTTOM = 60, 15, 30, 35
+
+# Fuente para los textos. Usamos DejaVu Sans, que viene incluida con matplotlib y soporta acentos;
+# si no se encuentra, usamos la fuente por defecto de Pillow.
+try:
+    _FONT = ImageFont.truetype(os.path.join(matplotlib.get_data_path(), "fonts", "ttf", "DejaVuSans.ttf"), 12)
+except OSError:
+    _FONT = ImageFont.load_default()
+
+# Colores en formato RGB.
+_WHITE = (255, 255, 255)
+_BLACK = (0, 0, 0)
+_GRID = (220, 220, 220)
+_BLUE = (0, 0, 255)
+_RED = (255, 0, 0)
+
+def _nice_ticks(lower, upper, count=8):
+    # Calculamos marcas "redondas" para los ejes (pasos de 1, 2 o 5 por una potencia de 10).
+    raw = (upper - lower) / count
+    magnitude = 10.0 ** np.floor(np.log10(raw))
+    step = magnitude * next(m for m in (1, 2, 5, 10) if m * magnitude >= raw)
+    ticks = np.arange(np.ceil(lower / step), np.floor(upper / step) + 1) * step
+    # Evitamos que errores de redondeo muestren marcas como "-0".
+    return np.where(np.abs(ticks) < step * 1e-9, 0.0, ticks)
+
+def _draw_polyline(arr, px, py, color, dash=0):
+    # Dibujamos una curva sobre el arreglo de píxeles. Cada segmento entre dos puntos se muestrea con un punto por píxel
+    # y todos los segmentos se calculan a la vez con numpy, sin recorrerlos en Python.
+    # Los segmentos con valores no finitos (por ejemplo log(x) con x negativo) se omiten.
+    valid = np.isfinite(px[:-1]) & np.isfinite(py[:-1]) & np.isfinite(px[1:]) & np.isfinite(py[1:])
+    # Acotamos las coordenadas verticales para que valores enormes no generen millones de puntos fuera de la imagen.
+    x0, x1 = px[:-1][valid], px[1:][valid]
+    y0, y1 = np.clip(py[:-1][valid], -_HEIGHT, 2 * _HEIGHT), np.clip(py[1:][valid], -_HEIGHT, 2 * _HEIGHT)
+    steps = np.ceil(np.maximum(np.abs(x1 - x0), np.abs(y1 - y0))).astype(np.intp) + 1
+    segment = np.repeat(np.arange(len(steps)), steps)
+    start = np.repeat(np.cumsum(steps) - steps, steps)
+    t = (np.arange(steps.sum()) - start) / np.maximum(steps[segment] - 1, 1)
+    xs = np.round(x0[segment] + t * (x1 - x0)[segment]).astype(np.intp)
+    ys = np.round(y0[segment] + t * (y1 - y0)[segment]).astype(np.intp)
+    # Para líneas punteadas alternamos tramos visibles y ocultos de 'dash' píxeles.
+    keep = (np.arange(len(xs)) // dash) % 2 == 0 if dash else np.ones(len(xs), dtype=bool)
+    # Solo pintamos los puntos que caen dentro del área de la gráfica.
+    keep &= (xs >= _LEFT) & (xs < _WIDTH - _RIGHT) & (ys >= _TOP) & (ys < _HEIGHT - _BOTTOM)
+    arr[ys[keep], xs[keep]] = color
+
+def _render_plot(X, Y1, Y2, title, labels):
+    # Dibujamos la gráfica de la función original (azul) y de la integral (roja, punteada) y la devolvemos como PNG.
+    Y1, Y2 = np.real(Y1).astype(np.float64), np.real(Y2).astype(np.float64)
+    plot_width, plot_height = _WIDTH - _LEFT - _RIGHT, _HEIGHT - _TOP - _BOTTOM
+
+    # Límites de los ejes: el eje X es fijo y el eje Y se ajusta a los valores finitos de ambas curvas con un margen del 5%.
+    x_min, x_max = float(X[0]), float(X[-1])
+    finite = np.concatenate((Y1[np.isfinite(Y1)], Y2[np.isfinite(Y2)]))
+    y_min, y_max = (float(finite.min()), float(finite.max())) if finite.size else (-1.0, 1.0)
+    if y_max - y_min < 1e-12:
+        y_min, y_max = y_min - 1.0, y_max + 1.0
+    margin = (y_max - y_min) * 0.05
+    y_min, y_max = y_min - margin, y_max + margin
+
+    # Transformación afín de coordenadas de datos a píxeles (el eje Y de la imagen crece hacia abajo).
+    def to_px(values):
+        return _LEFT + (values - x_min) / (x_max - x_min) * (plot_width - 1)
+    def to_py(values):
+        return _TOP + (y_max - values) / (y_max - y_min) * (plot_height - 1)
+
+    arr = np.full((_HEIGHT, _WIDTH, 3), _WHITE, dtype=np.uint8)
+
+    # Cuadrícula en las marcas de ambos ejes.
+    x_ticks, y_ticks = _nice_ticks(x_min, x_max), _nice_ticks(y_min, y_max)
+    x_tick_px = np.round(to_px(x_ticks)).astype(np.intp)
+    y_tick_py = np.round(to_py(y_ticks)).astype(np.intp)
+    arr[_TOP:_HEIGHT - _BOTTOM, x_tick_px] = _GRID
+    arr[y_tick_py, _LEFT:_WIDTH - _RIGHT] = _GRID
+
+    # Curvas de la función original y de la integral.
+    px = to_px(X)
+    _draw_polyline(arr, px, to_py(Y1), _BLUE)
+    _draw_polyline(arr, px, to_py(Y2), _RED, dash=6)
+
+    # Marco del área de la gráfica.
+    arr[_TOP, _LEFT:_WIDTH - _RIGHT] = _BLACK
+    arr[_HEIGHT - _BOTTOM - 1, _LEFT:_WIDTH - _RIGHT] = _BLACK
+    arr[_TOP:_HEIGHT - _BOTTOM, _LEFT] = _BLACK
+    arr[_TOP:_HEIGHT - _BOTTOM, _WIDTH - _RIGHT - 1] = _BLACK
+
+    # Los textos (título, marcas, nombres de los ejes y leyenda) los dibujamos con Pillow.
+    image = Image.fromarray(arr)
+    draw = ImageDraw.Draw(image)
+    draw.text((_WIDTH / 2, _TOP / 2), title, fill=_BLACK, font=_FONT, anchor="mm")
+    for value, position in zip(x_ticks, x_tick_px):
+        draw.text((position, _HEIGHT - _BOTTOM + 4), f"{value:g}", fill=_BLACK, font=_FONT, anchor="mt")
+    for value, position in zip(y_ticks, y_tick_py):
+        draw.text((_LEFT - 4, position), f"{value:.4g}", fill=_BLACK, font=_FONT, anchor="rm")
+    draw.text((_LEFT + plot_width / 2, _HEIGHT - 4), "x", fill=_BLACK, font=_FONT, anchor="mb")
+    draw.text((4, _TOP / 2), "f(x)", fill=_BLACK, font=_FONT, anchor="lm")
+    # Leyenda: una muestra de cada línea (la de la integral punteada) junto a su etiqueta.
+    for i, (label, color) in enumerate(zip(labels, (_BLUE, _RED))):
+        y = _TOP + 12 + 16 * i
+        if i == 0:
+            draw.line((_LEFT + 10, y, _LEFT + 30, y), fill=color, width=1)
+        else:
+            draw.line((_LEFT + 10, y, _LEFT + 15, y), fill=color, width=1)
+            draw.line((_LEFT + 22, y, _LEFT + 27, y), fill=color, width=1)
+        draw.text((_LEFT + 36, y), label, fill=_BLACK, font=_FONT, anchor="lm")
+
+    # Codificamos la imagen como PNG con el nivel de compresión más bajo, que es el más rápido.
+    buf = io.BytesIO()
+    image.save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+def _render_plot_matplotlib(X, Y1, Y2, title, labels):
+    # Versión de la gráfica con matplotlib, disponible con PLOT_BACKEND=matplotlib.
+    # Dibujamos sobre la figura compartida del proceso, limpiando primero los ejes de la gráfica anterior.
+    _AX.cla()
+    # Graficamos la función original en azul.
+    _AX.plot(X, Y1, label=labels[0], color="blue", linewidth=1, solid_joinstyle="miter")
+    # Graficamos la función integral en rojo con una línea punteada.
+    _AX.plot(X, Y2, label=labels[1], color="red", linestyle="--", linewidth=1, dash_joinstyle="miter")
+    _AX.set_title(title)
+    _AX.set_xlabel("x")
+    _AX.set_ylabel("f(x)")
+    _AX.legend()
+    _AX.grid(True)
+
+    # Guardamos el gráfico en un objeto BytesIO para luego enviarlo como respuesta.
+    # Usamos 72 DPI y el nivel de compresión más bajo de PNG, ya que la compresión zlib es el paso más costoso al guardar.
+    buf = io.BytesIO()
+    _FIG.savefig(buf, format="png", dpi=72, pil_kwargs={"compress_level": 1})
+    return buf.getvalue()
+
+# Definimos la variable simbólica 'x' que usaremos en las expresiones matemáticas.
+x = symbols('x')
+
+# Nombres permitidos en las expresiones: la variable x, las funciones matemáticas comunes y las constantes e y pi.
+# Cualquier otro nombre (una función o una variable distinta de x) produce un error.
+_ALLOWED = {
+    'x': x,
+    'sin': sin, 'cos': cos, 'tan': tan,
+    'asin': asin, 'acos': acos, 'atan': atan,
+    'sinh': sinh, 'cosh': cosh, 'tanh': tanh,
+    'exp': exp, 'log': log, 'ln': log, 'sqrt': sqrt,
+    'e': E, 'E': E, 'pi': pi,
+}
+
+# Espacio de nombres global del analizador: solo las clases que generan sus transformaciones para números y símbolos,
+# sin funciones integradas de Python.
+_PARSER_GLOBALS = {'__builtins__': {}, 'Integer': Integer, 'Float': Float, 'Rational': Rational, 'Symbol': Symbol}
+
+# Transformaciones del analizador: las estándar, '^' como potencia y multiplicación implícita (por ejemplo '2x' o 'sin x').
+# No usamos split_symbols, que convertiría nombres desconocidos como 'foo' en el producto f*o*o en lugar de rechazarlos.
+_TRANSFORMATIONS = standard_transformations + (convert_xor, implicit_multiplication, implicit_application, function_exponentiation)
+
+# Funciones auxiliares con caché: en una interfaz de enseñanza es muy común que se envíe la misma expresión
+# varias veces (o cambiando solo los límites), así que memorizamos el trabajo simbólico y la conversión numérica.
+# _symbolic_integrate guarda en caché el texto de la expresión; las cachés internas (integral, funciones numéricas,
+# LaTeX) usan la expresión de sympy, que se compara y se hashea por estructura (igual que su srepr), por lo que
+# formas equivalentes como 'x+x' y '2*x' comparten esas entradas.
+
+def _parse_expr(expr_str):
+    # Convertimos la expresión matemática de texto a una expresión simbólica que podamos trabajar, aceptando solo
+    # los nombres de _ALLOWED. Como 'e' es la constante de Euler, 'e**x' se interpreta directamente como exp(x).
+    # Antes rechazamos los accesos a atributos (por ejemplo 'x.__class__') y las cadenas de texto, que no forman parte
+    # de una expresión matemática y permitirían llegar a objetos de Python desde la entrada del usuario.
+    for token in tokenize.generate_tokens(io.StringIO(expr_str).readline):
+        if token.type == tokenize.STRING or (token.type == tokenize.OP and token.string in ('.', '...')):
+            raise ValueError("La expresión contiene elementos no permitidos.")
+    result = parse_expr(expr_str, local_dict=_ALLOWED, global_dict=_PARSER_GLOBALS, transformations=_TRANSFORMATIONS, evaluate=True)
+    if not isinstance(result, Expr):
+        raise ValueError("La expresión no es una expresión matemática.")
+    # Los nombres que no están en _ALLOWED se convierten en símbolos; solo aceptamos la variable x.
+    if result.free_symbols - {x}:
+        raise ValueError("La expresión contiene nombres no permitidos.")
+    return result
+
+@functools.lru_cache(maxsize=512)
+def _integrate(sym_expr):
+    # Calculamos la integral indefinida (sin límites) de la función recibida.
+    return integrate(sym_expr, x)
 
-    # Definimos la variable simbólica 'x' que usaremos en las expresiones matemáticas.
-    x = symbols('x')
-    
+def _jit(func):
+    # Intentamos compilar la función con numba.njit. La compilamos en este momento con un arreglo de prueba
+    # porque numba no soporta todas las salidas de lambdify y preferimos detectar el fallo aquí y no al graficar.
+    if numba is None:
+        return func
     try:
-        # Usamos sympy.sympify para convertir la expresión matemática de texto a una expresión simbólica que podamos trabajar.
-        # Reemplazamos 'e**' con 'exp' para asegurar que las funciones exponenciales sean correctamente interpretadas.
-        original_function = sympify(request.expression.replace("e**", "exp"))
+        fast = numba.njit(func)
+        fast(np.linspace(-1.0, 1.0, 2, dtype=_X_VALS.dtype))
+        return fast
+    except Exception:
+        # Si numba no puede compilarla, usamos la función de numpy original.
+        return func
+
+def _symengine_pair(sym_expr, int_expr):
+    # Compilamos ambas expresiones en una sola función de SymEngine con LLVM, que recorre los valores de X una sola vez
+    # y comparte las subexpresiones comunes (cse=True) entre la función original y su integral.
+    both = symengine.Lambdify([symengine.Symbol("x")], [symengine.sympify(sym_expr), symengine.sympify(int_expr)], backend="llvm", cse=True)
+
+    def evaluate_pair(values):
+        # El resultado tiene forma (n, 2): una columna por cada función.
+        result = both(values)
+        return result[:, 0], result[:, 1]
+
+    return evaluate_pair
+
+@functools.lru_cache(maxsize=512)
+def _lambdify_pair(sym_expr, int_expr):
+    # Convertimos la función original y su integral en una sola función numérica que devuelve ambos resultados,
+    # así los valores de X se recorren una sola vez. Cada opción se prueba con un arreglo pequeño antes de usarla.
+    # Como el resultado queda en la caché, la compilación se paga una sola vez por expresión.
+    probe = np.linspace(-1.0, 1.0, 2, dtype=_X_VALS.dtype)
+
+    # Primero intentamos compilar las expresiones con SymEngine y LLVM. La integral se sigue calculando con sympy,
+    # por lo que convertimos las expresiones a SymEngine solo para generar la función numérica.
+    if symengine is not None:
+        try:
+            fast = _symengine_pair(sym_expr, int_expr)
+            fast(probe)
+            return fast
+        except Exception:
+            pass
+    # Después intentamos generar la función con numexpr, que fusiona cada expresión completa en un solo recorrido.
+    # Numexpr no soporta todas las funciones que puede producir sympy, por eso la probamos.
+    if numexpr is not None:
+        try:
+            fast = lambdify(x, (sym_expr, int_expr), modules="numexpr")
+            fast(probe)
+            return fast
+        except Exception:
+            pass
+    # Si numexpr falla, convertimos las expresiones con numpy. Con cse=True las subexpresiones repetidas
+    # (por ejemplo sin(x) en sin(x)*cos(x) + sin(x)**2) se calculan una sola vez, y luego intentamos compilarla con numba.
+    return _jit(lambdify(x, (sym_expr, int_expr), modules=["numpy"], cse=True))
+
+def _has_no_poles(antiderivative, lower, upper):
+    # Comprobación rápida de que la integral indefinida es continua en el intervalo: aceptamos solo polinomios y
+    # funciones racionales cuyo denominador no tenga raíces reales en [lower, upper]. Para cualquier otra expresión
+    # comprobarlo cuesta más que volver a integrar, así que respondemos que no.
+    if antiderivative.is_polynomial(x):
+        return True
+    if not antiderivative.is_rational_function(x):
+        return False
+    try:
+        denominator = Poly(antiderivative.as_numer_denom()[1], x)
+        return denominator.count_roots(min(lower, upper), max(lower, upper)) == 0
+    except Exception:
+        return False
+
+@functools.lru_cache(maxsize=512)
+def _definite_integral(sym_expr, lower, upper):
+    # Si la integral indefinida (que ya está en la caché) es continua en el intervalo, calculamos la integral definida
+    # evaluándola en los límites en lugar de volver a integrar. Si no, dejamos que sympy calcule la integral con los límites.
+    # En ambos casos devolvemos el valor numérico, ya que los límites son números.
+    antiderivative = _integrate(sym_expr)
+    if _has_no_poles(antiderivative, lower, upper):
+        return (antiderivative.subs(x, upper) - antiderivative.subs(x, lower)).evalf()
+    return integrate(sym_expr, (x, lower, upper)).evalf()
+
+@functools.lru_cache(maxsize=2048)
+def _latex(sym_expr):
+    # Convertimos una expresión (o un término) a LaTeX. Términos como x**2 o sin(x) se repiten mucho entre solicitudes,
+    # así que guardamos el resultado en caché.
+    return latex(sym_expr)
+
+@functools.lru_cache(maxsize=512)
+def _symbolic_integrate(expr_str):
+    # Agrupamos el trabajo simbólico de una expresión: la función original y su integral. Las funciones numéricas
+    # se generan aparte en _plot_png, para que un fallo al compilarlas solo afecte a la gráfica.
+    original = _parse_expr(expr_str)
+    return original, _integrate(original)
+
+@functools.lru_cache(maxsize=128)
+def _plot_png(expression):
+    # Generamos la gráfica de la función original y de su integral como bytes PNG. La gráfica solo depende de la expresión,
+    # así que guardamos los bytes en caché y los reutilizamos tal cual, sin copiarlos a un buffer intermedio.
+    original_function, integrated_function = _symbolic_integrate(expression)
+    functions_np = _lambdify_pair(original_function, integrated_function)
+
+    # Evaluamos los valores de la función original e integral para graficarlos.
+    original_Y_vals, integrated_Y_vals = functions_np(_X_VALS)
+
+    # Si con float32 algún valor se desborda a infinito, volvemos a evaluar con float64. Los NaN por dominio
+    # (log, sqrt o tan fuera de su dominio) también aparecen con float64, así que no repetimos la evaluación por ellos.
+    if np.any(np.isinf(original_Y_vals)) or np.any(np.isinf(integrated_Y_vals)):
+        original_Y_vals, integrated_Y_vals = functions_np(_X_VALS_F64)
+
+    # Verificamos que las dimensiones de los resultados sean correctas.
+    if len(original_Y_vals) != len(_X_VALS) or len(integrated_Y_vals) != len(_X_VALS):
+        raise ValueError("La dimensión de X_vals no coincide con la de Y_vals.")
+
+    # Etiquetas de la leyenda de la gráfica.
+    expr_label = expression.replace('**', '^').replace('*', ' ')
+    integrated_label = str(integrated_function).replace('**', '^').replace('*', ' ')
+
+    # Generamos la gráfica en PNG con la forma de dibujo configurada.
+    render = _render_plot_matplotlib if _PLOT_BACKEND == "matplotlib" else _render_plot
+    return render(_X_VALS, original_Y_vals, integrated_Y_vals, "Gráfica de la función original e integral",
+                  (f"Original: {expr_label}", f"Integral: {integrated_label}"))
+
+def _warmup():
+    # Preparamos cada proceso de cálculo antes de recibir solicitudes. La primera gráfica carga las fuentes y el primer
+    # cálculo inicializa sympy y compila la función numérica; además hacemos una compilación trivial con numba,
+    # cuya primera compilación en cada proceso tarda cientos de milisegundos.
+    # Si algo falla aquí, el proceso sigue funcionando sin preparar: un error en la inicialización dejaría inutilizable
+    # todo el grupo de procesos.
+    try:
+        _plot_png("x")
+        if numba is not None:
+            numba.njit(lambda values: values + 1.0)(_X_VALS[:2])
+    except Exception:
+        pass
+
+def _ready():
+    # Tarea vacía que usamos al arrancar para que el grupo inicie todos sus procesos.
+    return True
+
+# Grupo de procesos donde se ejecuta el cálculo. Todo el trabajo (sympy, numpy y matplotlib) es de CPU y sin liberar el GIL,
+# así que usamos procesos en lugar de hilos para que solicitudes independientes se calculen en paralelo en distintos núcleos.
+# Cada proceso mantiene sus propias cachés (y, con matplotlib, su propia figura) y ejecuta _warmup al iniciar.
+_WORKERS = os.cpu_count() or 1
+_POOL = concurrent.futures.ProcessPoolExecutor(max_workers=_WORKERS, initializer=_warmup)
+
+async def _run_in_pool(func, *args):
+    # Ejecutamos la función en el grupo de procesos y esperamos el resultado sin bloquear el bucle de eventos.
+    # Si un proceso muere, el grupo queda inutilizable (BrokenProcessPool); en ese caso lo reemplazamos por uno nuevo
+    # para las siguientes solicitudes y dejamos que la solicitud actual informe el error.
+    global _POOL
+    pool = _POOL
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        if _POOL is pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+            _POOL = concurrent.futures.ProcessPoolExecutor(max_workers=_WORKERS, initializer=_warmup)
+        raise
+
+# Realiza todo el cálculo de una solicitud: integral, explicación paso a paso y gráfica. Es una función normal (no async)
+# para poder ejecutarla en el grupo de procesos.
+def _compute(expression, lower_limit, upper_limit):
+    try:
+        # Obtenemos (desde la caché si ya se calculó antes) la función original y su integral indefinida.
+        original_function, integrated_function = _symbolic_integrate(expression)
     except Exception as e:
         # Si hay un error en la expresión (por ejemplo, un formato incorrecto), devolvemos un mensaje de error.
         return {"error": "Error en la expresión matemática proporcionada."}
 
-    # Calculamos la integral indefinida (sin límites) de la función recibida.
-    integrated_function = integrate(original_function, x)
+    # Preparamos una sola vez las versiones en LaTeX de la expresión y de su integral, que reutilizamos en todos los pasos.
+    expr_latex = _latex(original_function)
+    integrated_str = str(integrated_function)
+    integrated_latex = _latex(integrated_function)
 
     # Creamos una lista para almacenar los pasos que explicarán cómo se resolvió la integral en formato LaTeX.
     steps = []
 
     # Paso 1: Mostramos la integral original en formato LaTeX.
-    steps.append(f"Problema: \\( \\int {request.expression.replace('**', '^').replace('*', '\\,')} \\, dx \\)")
+    steps.append(f"Problema: \\( \\int {expr_latex} \\, dx \\)")
 
     # Dividimos la expresión en términos si es una suma para descomponer la integral, lo que facilita su resolución.
-    terms = request.expression.split('+')
+    # Usamos los términos de la expresión simbólica en lugar de separar el texto por '+', así los paréntesis y las restas se respetan.
+    terms = original_function.as_ordered_terms()
     if len(terms) > 1:
         steps.append("1. Descomponer la integral en términos:")
         for term in terms:
             # Añadimos cada término de la suma por separado para resolverlo individualmente.
-            steps.append(f"   \\( \\int {term.strip().replace('**', '^').replace('*', '\\,')} \\, dx \\)")
+            steps.append(f"   \\( \\int {_latex(term)} \\, dx \\)")
     else:
-        steps.append(f"1. Resolver la integral directamente para \\( \\int {request.expression.replace('**', '^').replace('*', '\\,')} \\, dx \\)")
+        steps.append(f"1. Resolver la integral directamente para \\( \\int {expr_latex} \\, dx \\)")
 
     # Paso 2: Explicamos las reglas que aplicamos a cada término, según su tipo.
+    # Clasificamos cada término revisando su estructura simbólica (qué funciones contiene y si es un polinomio).
     for term in terms:
-        term = term.strip()  # Limpiamos el término para evitar espacios en blanco.
+        term_latex = _latex(term)  # Versión en LaTeX del término.
 
         # Si el término contiene funciones trigonométricas, aplicamos las reglas de integración trigonométrica.
-        if 'sin' in term or 'cos' in term or 'tan' in term:
-            steps.append(f"2. Aplicar la regla de integración trigonométrica a \\( {term.replace('**', '^').replace('*', '\\,')} \\):")
-            if 'sin' in term:
+        if term.has(sin, cos, tan):
+            steps.append(f"2. Aplicar la regla de integración trigonométrica a \\( {term_latex} \\):")
+            if term.has(sin):
                 steps.append("   \\( \\int \\sin(x) \\, dx = -\\cos(x) \\)")
-            elif 'cos' in term:
+            elif term.has(cos):
                 steps.append("   \\( \\int \\cos(x) \\, dx = \\sin(x) \\)")
-            elif 'tan' in term:
+            elif term.has(tan):
                 steps.append("   \\( \\int \\tan(x) \\, dx = \\ln(\\cos(x)) \\)")
 
+        # Si el término contiene funciones trigonométricas inversas, aplicamos la integración por partes.
+        elif term.has(asin, acos, atan):
+            steps.append(f"2. Aplicar la integración por partes a \\( {term_latex} \\):")
+            if term.has(asin):
+                steps.append("   \\( \\int \\arcsin(x) \\, dx = x \\arcsin(x) + \\sqrt{1 - x^2} \\)")
+            elif term.has(acos):
+                steps.append("   \\( \\int \\arccos(x) \\, dx = x \\arccos(x) - \\sqrt{1 - x^2} \\)")
+            elif term.has(atan):
+                steps.append("   \\( \\int \\arctan(x) \\, dx = x \\arctan(x) - \\frac{1}{2} \\ln(1 + x^2) \\)")
+
+        # Si el término contiene funciones hiperbólicas, aplicamos las reglas de integración hiperbólica.
+        elif term.has(sinh, cosh, tanh):
+            steps.append(f"2. Aplicar la regla de integración hiperbólica a \\( {term_latex} \\):")
+            if term.has(sinh):
+                steps.append("   \\( \\int \\sinh(x) \\, dx = \\cosh(x) \\)")
+            elif term.has(cosh):
+                steps.append("   \\( \\int \\cosh(x) \\, dx = \\sinh(x) \\)")
+            elif term.has(tanh):
+                steps.append("   \\( \\int \\tanh(x) \\, dx = \\ln(\\cosh(x)) \\)")
+
         # Si el término contiene logaritmos, aplicamos la regla de integración por partes.
-        elif 'log' in term or 'ln' in term:
-            steps.append(f"2. Aplicar la integración por partes a \\( {term.replace('**', '^').replace('*', '\\,')} \\):")
+        elif term.has(log):
+            steps.append(f"2. Aplicar la integración por partes a \\( {term_latex} \\):")
             steps.append("   \\( \\int \\ln(x) \\, dx = x \\ln(x) - x + C \\)")
 
         # Si el término es una función exponencial, aplicamos la regla correspondiente.
-        elif 'exp' in term or 'e^' in term:
-            steps.append(f"2. Aplicar la regla de integración exponencial a \\( {term.replace('**', '^').replace('*', '\\,')} \\):")
+        elif term.has(exp):
+            steps.append(f"2. Aplicar la regla de integración exponencial a \\( {term_latex} \\):")
             steps.append("   \\( \\int e^x \\, dx = e^x \\)")
 
-        # Para términos polinomiales (x**n), aplicamos la regla de potencias.
-        elif 'x**' in term:
-            steps.append(f"2. Aplicar la regla de integración de potencias a \\( {term.replace('**', '^').replace('*', '\\,')} \\):")
-            steps.append("   \\( \\int x^n \\, dx = \\frac{x^{n+1}}{n+1} \\)")
+        # Para constantes simples (términos que no dependen de x), usamos la regla de integración de constantes.
+        elif not term.has(x):
+            steps.append(f"2. Aplicar la regla para constantes a \\( {term_latex} \\):")
+            steps.append("   \\( \\int a \\, dx = ax \\)")
 
         # Si es un término lineal como 'ax', aplicamos la regla de integración lineal.
-        elif 'x' in term:
-            steps.append(f"2. Aplicar la regla de integración lineal a \\( {term.replace('**', '^').replace('*', '\\,')} \\):")
+        elif term.is_polynomial(x) and degree(term, x) == 1:
+            steps.append(f"2. Aplicar la regla de integración lineal a \\( {term_latex} \\):")
             steps.append("   \\( \\int ax \\, dx = \\frac{ax^2}{2} \\)")
 
-        # Para constantes simples, usamos la regla de integración de constantes.
+        # Para el resto de términos con potencias de x (x**n), aplicamos la regla de potencias.
         else:
-            steps.append(f"2. Aplicar la regla para constantes a \\( {term.replace('**', '^').replace('*', '\\,')} \\):")
-            steps.append("   \\( \\int a \\, dx = ax \\)")
+            steps.append(f"2. Aplicar la regla de integración de potencias a \\( {term_latex} \\):")
+            steps.append("   \\( \\int x^n \\, dx = \\frac{x^{n+1}}{n+1} \\)")
 
     # Paso 3: Sumar los resultados de la integración de cada término.
     steps.append("3. Sumar los resultados parciales:")
-    steps.append(f"   Resultado final: \\( {str(integrated_function).replace('**', '^').replace('*', '\\,')} + C \\)")
+    steps.append(f"   Resultado final: \\( {integrated_latex} + C \\)")
 
     # Si se proporcionan los límites inferior y superior, calculamos la integral definida.
-    if request.lower_limit is not None and request.upper_limit is not None:
+    if lower_limit is not None and upper_limit is not None:
         try:
             # Calculamos la integral definida utilizando los límites proporcionados.
-            defined_integral = integrate(original_function, (x, request.lower_limit, request.upper_limit))
-            steps.append(f"4. Valor de la integral definida con límites \\( {request.lower_limit} \\) y \\( {request.upper_limit} \\):")
-            steps.append(f"   \\( \\int_{{{request.lower_limit}}}^{{{request.upper_limit}}} {request.expression.replace('**', '^').replace('*', '\\,')} \\, dx = {defined_integral} \\)")
+            defined_integral = _definite_integral(original_function, lower_limit, upper_limit)
+            steps.append(f"4. Valor de la integral definida con límites \\( {lower_limit} \\) y \\( {upper_limit} \\):")
+            steps.append(f"   \\( \\int_{{{lower_limit}}}^{{{upper_limit}}} {expr_latex} \\, dx = {defined_integral} \\)")
         except Exception as e:
             # Si ocurre un error al calcular la integral definida, devolvemos el mensaje de error.
             return {"error": f"Error al calcular la integral definida: {e}"}
     else:
         defined_integral = None  # Si no hay límites, no se calcula la integral definida.
 
-    # Ahora, creamos los gráficos de la función original y de la integral.
-    # Convertimos las expresiones simbólicas a funciones numéricas utilizando lambdify para poder graficarlas.
-    original_function_np = lambdify(x, original_function, {"sin": np.sin, "cos": np.cos, "tan": np.tan, "exp": np.exp, "log": np.log})
-    integrated_function_np = lambdify(x, integrated_function, {"sin": np.sin, "cos": np.cos, "tan": np.tan, "exp": np.exp, "log": np.log})
-    
-    # Generamos un conjunto de valores de X entre -10 y 10 para la gráfica.
-    X_vals = np.linspace(-10, 10, 400)
-    
+    # Ahora, creamos la gráfica de la función original y de la integral (desde la caché si ya se generó antes).
     try:
-        # Evaluamos los valores de la función original e integral para graficarlos.
-        original_Y_vals = original_function_np(X_vals)
-        integrated_Y_vals = integrated_function_np(X_vals)
-
-        # Verificamos que las dimensiones de los resultados sean correctas.
-        if len(original_Y_vals) != len(X_vals) or len(integrated_Y_vals) != len(X_vals):
-            raise ValueError("La dimensión de X_vals no coincide con la de Y_vals.")
-        
+        png = _plot_png(expression)
     except Exception as e:
         # Si ocurre algún error durante la evaluación de las funciones, devolvemos el mensaje de error.
         return {"error": f"Error al evaluar la función: {e}"}
-    
-    # Creamos la figura del gráfico con matplotlib.
-    plt.figure(figsize=(10, 6))
-    # Graficamos la función original en azul.
-    plt.plot(X_vals, original_Y_vals, label=f"Original: {request.expression.replace('**', '^').replace('*', ' ')}", color="blue")
-    # Graficamos la función integral en rojo con una línea punteada.
-    plt.plot(X_vals, integrated_Y_vals, label=f"Integral: {str(integrated_function).replace('**', '^').replace('*', ' ')}", color="red", linestyle="--")
-    plt.title("Gráfica de la función original e integral")
-    plt.xlabel("x")
-    plt.ylabel("f(x)")
-    plt.legend()
-    plt.grid(True)
 
-    # Guardamos el gráfico en un objeto BytesIO para luego enviarlo como respuesta.
-    graph_buffer = io.BytesIO()
-    plt.savefig(graph_buffer, format="png")
-    graph_buffer.seek(0)
-    plt.close()
+    # Codificamos la imagen en base64 para devolverla junto con el resultado, sin necesidad de una segunda petición.
+    graph_png_b64 = base64.b64encode(png).decode()
 
     # Retornamos la integral indefinida y, si fue calculada, la integral definida, junto con la explicación paso a paso.
     return {
-        "indefinite_integral": str(integrated_function).replace('**', '^').replace('*', '\\,'),  # Integral indefinida
+        "indefinite_integral": integrated_str.replace('**', '^').replace('*', '\\,'),  # Integral indefinida
         "defined_integral": str(defined_integral) if defined_integral is not None else "No se proporcionaron límites",  # Integral definida
-        "explanation": steps  # Explicación paso a paso en formato LaTeX
+        "explanation": steps,  # Explicación paso a paso en formato LaTeX
+        "graph_png_b64": graph_png_b64  # Gráfica en formato PNG codificada en base64
     }
 
-# Ruta para obtener la gráfica generada. Si no hay gráfica disponible, se devuelve un error.
+# Ruta para calcular la integral, donde recibimos una expresión matemática en formato string.
+@app.post("/calculate-integral")
+async def calculate_integral(request: IntegralRequest):
+    # Enviamos el cálculo al grupo de procesos y esperamos el resultado sin bloquear el bucle de eventos.
+    try:
+        return await _run_in_pool(_compute, request.expression, request.lower_limit, request.upper_limit)
+    except BrokenProcessPool:
+        return {"error": "Error interno al calcular la integral. Intenta de nuevo."}
+
+# Ruta para obtener solo la gráfica de una expresión como imagen PNG. No guardamos ninguna gráfica global en el servidor
+# (una solicitud podía sobrescribir la de otro usuario): la generamos a partir de la expresión, o la tomamos de la caché.
 @app.get("/get-graph")
-async def get_graph():
-    global graph_buffer
-    if graph_buffer:
-        # Enviamos el gráfico como una respuesta de imagen.
-        return StreamingResponse(graph_buffer, media_type="image/png")
-    else:
-        return {"error": "No hay gráfica generada."}
+async def get_graph(expression: str = None):
+    if expression is None:
+        return {"error": "Indica la expresión en el parámetro 'expression' o usa el campo 'graph_png_b64' de /calculate-integral."}
+    try:
+        png = await _run_in_pool(_plot_png, expression)
+    except Exception as e:
+        return {"error": f"Error al generar la gráfica: {e}"}
+    # Enviamos los bytes PNG directamente en la respuesta, en una sola escritura.
+    return Response(png, media_type="image/png")